@@ -1,22 +1,27 @@
 import os
 import os.path as op
-import json
+import asyncio
+import orjson
+from copy import deepcopy
+from pathlib import Path
 from stripe.api_resources import payment_intent
 import yaml
 from glob import glob
 from typing import Optional
+from urllib.parse import urlencode
 from dotenv import load_dotenv
 import sendgrid  # sendgrid API
 from sendgrid.helpers.mail import *
 import stripe
 
-load_dotenv(dotenv_path="../.env")  # setting all credentials here
-assert os.environ.get(
-    "GOOGLE_APPLICATION_CREDENTIALS"
-), "Please check if GOOGLE_APPLICATION_CREDENTIALS is specified in environment file"
-assert os.environ.get(
-    "AIRTABLE_KEY"
-), "Please check if AIRTABLE_KEY is specified in environment file"
+# in production, environment variables are injected directly, skip .env file
+if os.environ.get("ENV") != "prod":
+    load_dotenv(dotenv_path="../.env", override=False)  # setting all credentials here
+for env_key in ["GOOGLE_APPLICATION_CREDENTIALS", "AIRTABLE_KEY"]:
+    if not os.environ.get(env_key):
+        raise RuntimeError(
+            f"Please check if {env_key} is specified in environment file"
+        )
 SENDGRID_API = os.environ.get("SENDGRID_API_KEY", "You did not specify Sendgrid API")
 if not SENDGRID_API:
     print(
@@ -28,58 +33,74 @@ STRIPE_API_KEY = os.environ.get("STRIPE_SECRET_KEY")
 if STRIPE_API_KEY:
     stripe.api_key = STRIPE_API_KEY
 
-import joblib
-from elasticsearch import Elasticsearch
+from elasticsearch import AsyncElasticsearch
 from elasticsearch_dsl import Search
 import pandas as pd
 from pydantic import BaseModel
-from pyairtable import Table
 import utils  # import utils as a library, make sure to load environment variables before
 from utils import get_user_info, get_data, set_data, update_data, get_agenda
 
 from fastapi import FastAPI, Query, Header, status
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.decorator import cache
 
 import google.cloud
+from google.cloud import firestore
 from google.oauth2 import id_token
 from google.auth.transport.requests import Request
 
-# get Firebase collections
+# get Firebase collections, use libyaml C loader when available
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 with open("../sitedata/config.yml") as f:
-    site_config = yaml.load(f, Loader=yaml.FullLoader)
+    site_config = yaml.load(f, Loader=YAML_LOADER)
 with open("../scripts/es_config.yml") as f:
-    es_config = yaml.load(f, Loader=yaml.FullLoader)
+    es_config = yaml.load(f, Loader=YAML_LOADER)
+# email templates, read once instead of on every confirmation email
+EMAIL_CONTENT = orjson.loads(Path("../sitedata/email-content.json").read_bytes())
 
 current_edition = site_config["current_edition"]
 collections = site_config["firebase-collection"][current_edition]
 user_collection = collections["users"]
 preference_collection = collections["preferences"]
+# batch concurrent reads of users and preferences from Firebase
+user_batcher = utils.DocumentBatcher(user_collection)
+preference_batcher = utils.DocumentBatcher(preference_collection)
 
-es = Elasticsearch([{"host": es_config["host"], "port": es_config["port"]}])
+es = AsyncElasticsearch([{"host": es_config["host"], "port": es_config["port"]}])
 
 # loading model and embeddings
-model_paths = glob("../sitedata/embeddings/*.joblib")
-embedding_paths = glob("../sitedata/embeddings/*.json")
-if len(model_paths) > 0:
-    nbrs_models = {
-        op.basename(path).split(".")[0]: joblib.load(path) for path in model_paths
-    }
+model_paths = glob("../sitedata/embeddings/*.hnsw")
+embedding_paths = glob("../sitedata/embeddings/*.npz")
 if len(embedding_paths) > 0:
     embeddings = {
-        op.basename(path).split(".")[0]: json.load(open(path, "r"))
+        op.basename(path).split(".")[0]: utils.load_embeddings(path)
         for path in embedding_paths
     }
+if len(model_paths) > 0:
+    nbrs_models = {}
+    for path in model_paths:
+        name = op.basename(path).split(".")[0]
+        dim = embeddings[name]["X"].shape[1]  # HNSW index needs embedding dimension
+        nbrs_models[name] = utils.load_nbrs_model(path, dim=dim)
 airtable_key = os.environ.get("AIRTABLE_KEY")
 # map between "edition" and "filter_accepted", default as False
 FILTER_ACCEPTED = {
     k: v.get("filter_accepted", False) for k, v in es_config["editions"].items()
 }
+# minimum number of nearest neighbors for recommendations without time window
+N_RECOMMEND = 200
+# map between "edition" and ("airtable_id", "table_name"), None if not set
+EDITION_MAP = {
+    k: (v.get("airtable_id"), v.get("table_name"))
+    for k, v in es_config["editions"].items()
+}
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -94,6 +115,21 @@ app.add_middleware(
 HTTP_REQUEST = Request()
 
 
+@app.on_event("startup")
+async def init_cache():
+    """Initialize in-memory cache used for ElasticSearch counts"""
+    FastAPICache.init(InMemoryBackend())
+
+
+@app.on_event("shutdown")
+async def close_connections():
+    """Close ElasticSearch connections and Firebase batchers when the app shuts down"""
+    await es.close()
+    await utils.es.close()
+    await user_batcher.close()
+    await preference_batcher.close()
+
+
 class Submission(BaseModel):
     # fields provided by users
     title: str = ""
@@ -134,10 +170,10 @@ async def get_affiliations(
     if n_results is None:
         n_results = 10
     if q is not None:
-        queries = utils.query_affiliations(q, n_results=n_results)
+        queries = await utils.query_affiliations(q, n_results=n_results)
     else:
         queries = []
-    return JSONResponse(content={"data": queries})
+    return ORJSONResponse(content={"data": queries})
 
 
 @app.post("/api/confirmation/{email_type}")
@@ -157,12 +193,11 @@ async def send_confirmation_email(
         email = user_info.get("email")
         sg = sendgrid.SendGridAPIClient(api_key=SENDGRID_API)
 
-        email_content = json.load(open("../sitedata/email-content.json", "r"))
-        data = email_content.get(email_type)
+        data = deepcopy(EMAIL_CONTENT.get(email_type))  # keep template untouched
         for d in data["personalizations"]:
             d.update({"to": [{"email": email}]})
         response = sg.client.mail.send.post(request_body=data)
-        return JSONResponse(status_code=response.status_code)
+        return ORJSONResponse(status_code=response.status_code)
     else:
         return None
 
@@ -182,13 +217,13 @@ async def get_user(authorization: Optional[str] = Header(None)):
     user_info = get_user_info(authorization)
     if user_info is not None:
         user_id = user_info.get("user_id")
-        user = get_data(user_id, user_collection)
+        user = await user_batcher.get(user_id)
         if user is not None:
-            return JSONResponse(content={"data": user})
+            return ORJSONResponse(content={"data": user})
         else:
-            return JSONResponse(content={"data": {}})
+            return ORJSONResponse(content={"data": {}})
     else:
-        return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
+        return ORJSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
 
 
 @app.post("/api/user")
@@ -203,10 +238,10 @@ async def create_user(
     user_info = get_user_info(authorization)
     if user_info is not None:
         user_id = user_info.get("user_id")
-        set_data(user_data["payload"], user_id, user_collection)  # set data
+        await set_data(user_data["payload"], user_id, user_collection)  # set data
         print(f"Done setting user with ID = {user_id}")
     else:
-        return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
+        return ORJSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
 
 
 @app.put("/api/user")
@@ -219,10 +254,10 @@ async def update_user(
     user_info = get_user_info(authorization)
     if user_info is not None:
         user_id = user_info.get("user_id")
-        update_data(user_data["payload"], user_id, user_collection)  # update data
+        await update_data(user_data["payload"], user_id, user_collection)  # update data
         print(f"Done setting user with ID = {user_id}")
     else:
-        return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
+        return ORJSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
 
 
 @app.get("/api/user/preference/")
@@ -233,12 +268,12 @@ async def get_user_votes(authorization: Optional[str] = Header(None)):
     user_info = get_user_info(authorization)
     if user_info is not None:
         user_id = user_info.get("user_id")
-        user_preference = get_data(user_id, preference_collection)  # all preferences
+        user_preference = await preference_batcher.get(user_id)  # all preferences
         if user_preference is None:
             user_preference = []
-        return JSONResponse(content={"data": user_preference})
+        return ORJSONResponse(content={"data": user_preference})
     else:
-        return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
+        return ORJSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
 
 
 @app.get("/api/user/preference/{edition}")
@@ -249,7 +284,7 @@ async def get_user_votes(edition: str, authorization: Optional[str] = Header(Non
     user_info = get_user_info(authorization)
     if user_info is not None:
         user_id = user_info.get("user_id")
-        user_preference = get_data(user_id, preference_collection)  # all preferences
+        user_preference = await preference_batcher.get(user_id)  # all preferences
 
         if user_preference is not None:
             ids = user_preference.get(edition, [])
@@ -259,9 +294,9 @@ async def get_user_votes(edition: str, authorization: Optional[str] = Header(Non
                 abstracts = []
         else:
             abstracts = []
-        return JSONResponse(content={"data": abstracts})
+        return ORJSONResponse(content={"data": abstracts})
     else:
-        return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
+        return ORJSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
 
 
 @app.patch("/api/user/preference/{edition}/{submission_id}")
@@ -281,42 +316,45 @@ async def update_user_votes(
     # TODOs: set preference on Firebase
     user_info = get_user_info(authorization)
     if user_info is None:
-        return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
+        return ORJSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
     user_id = user_info.get("user_id")
-    user_preference = get_data(user_id, preference_collection)  # all preferences
 
     action = action.dict()["action"]
 
+    # preferences are updated with atomic array operations on Firebase,
+    # so we do not need to read the current preferences first
     if action == "like" and user_id is not None:
-        if user_preference is None:
-            user_preference = {edition: [submission_id]}
-            try:
-                set_data(user_preference, user_id, preference_collection)
-            except (google.cloud.exceptions.NotFound, TypeError):
-                return JSONResponse(status_code=status.HTTP_404_NOT_FOUND)
-        else:
-            current_pref = user_preference.get(edition, [])
-            update_pref = list(set([*current_pref, submission_id]))
-            if len(update_pref) > 0:
-                try:
-                    update_data({edition: update_pref}, user_id, preference_collection)
-                except (google.cloud.exceptions.NotFound, TypeError):
-                    return JSONResponse(status_code=status.HTTP_404_NOT_FOUND)
-            else:
-                pass
+        # add to preferences, create the preference document if it does not exist
+        try:
+            await set_data(
+                {edition: firestore.ArrayUnion([submission_id])},
+                user_id,
+                preference_collection,
+                merge=True,
+            )
+        except (google.cloud.exceptions.NotFound, TypeError):
+            return ORJSONResponse(status_code=status.HTTP_404_NOT_FOUND)
     elif action == "dislike" and user_id is not None:
-        if user_preference is None:
-            return JSONResponse(status_code=status.HTTP_404_NOT_FOUND)
-        else:
-            current_pref = user_preference.get(edition, [])
-            update_pref = list(set(current_pref) - set([submission_id]))
-            user_preference.update({edition: update_pref})
-            try:
-                update_data(user_preference, user_id, preference_collection)
-            except (google.cloud.exceptions.NotFound, TypeError):
-                return JSONResponse(status_code=status.HTTP_404_NOT_FOUND)
+        # remove from preferences, raise NotFound if there is no preference document
+        try:
+            await update_data(
+                {edition: firestore.ArrayRemove([submission_id])},
+                user_id,
+                preference_collection,
+            )
+        except (google.cloud.exceptions.NotFound, TypeError):
+            return ORJSONResponse(status_code=status.HTTP_404_NOT_FOUND)
     else:
-        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST)
+        return ORJSONResponse(status_code=status.HTTP_400_BAD_REQUEST)
+
+
+@cache(expire=60)
+async def get_edition_count(edition: str):
+    """
+    Count number of submissions indexed for a given edition,
+    cached for 60 seconds since the agenda index rarely changes
+    """
+    return (await es.count(index=f"agenda-{edition}"))["count"]
 
 
 def query_params_builder(
@@ -334,29 +372,54 @@ def query_params_builder(
             if current_page >= total_pages:
                 return None
 
-        if kvs is not None:
-            for (k, v) in kvs:
-                if v is not None:
-                    separator = "?" if "?" not in base_endpoint else "&"
-                    base_endpoint += f"{separator}{k}={v}"
-        return base_endpoint
+        params = urlencode([(k, v) for (k, v) in (kvs or []) if v is not None])
+        if params == "":
+            return base_endpoint
+        separator = "?" if "?" not in base_endpoint else "&"
+        return f"{base_endpoint}{separator}{params}"
 
     return builder
 
 
+def page_links(
+    base_endpoint: str,
+    kvs: list,
+    skip: int,
+    page_size: int,
+    current_page: int,
+    total_pages: int,
+):
+    """
+    Create links to the current and the next page from a given base_endpoint,
+    both links share query arguments ``kvs`` and only differ in ``skip``
+    """
+    return {
+        "current": query_params_builder()(
+            base_endpoint, [*kvs, ("skip", skip), ("limit", page_size)]
+        ),
+        "next": query_params_builder(current_page, total_pages)(
+            base_endpoint, [*kvs, ("skip", skip + page_size), ("limit", page_size)]
+        ),
+    }
+
+
 @app.get("/api/abstract/{edition}/startend")
-def get_startend_event(edition: str = "2021-1"):
+async def get_startend_event(edition: str = "2021-1"):
     """
     Get starttime and endtime for all events from a given edition
 
     edition: str, conference Edition such as "2021-1"
     """
-    es_search = Search(using=es, index=f"agenda-{edition}")
+    es_search = Search()
     try:
         first_event = es_search.sort("starttime", {"starttime": {"order": "asc"}})
         last_event = es_search.sort("-starttime", {"endtime": {"order": "asc"}})
-        first_event = first_event[0].execute().to_dict()
-        last_event = last_event[0].execute().to_dict()
+        first_event = await es.search(
+            index=f"agenda-{edition}", body=first_event[0].to_dict()
+        )
+        last_event = await es.search(
+            index=f"agenda-{edition}", body=last_event[0].to_dict()
+        )
         return {
             "starttime": first_event["hits"]["hits"][0]["_source"]["starttime"],
             "endtime": last_event["hits"]["hits"][0]["_source"]["endtime"],
@@ -379,11 +442,13 @@ async def get_agenda(edition: str, starttime: Optional[str] = None):
         2020-10-26 10:00:00, 2020-10-26 10:00:00+00:00
     """
     if starttime is not None:
-        abstracts = utils.get_agenda(index=f"agenda-{edition}", starttime=starttime)
+        abstracts = await utils.get_agenda(
+            index=f"agenda-{edition}", starttime=starttime
+        )
     else:
         abstracts = []
 
-    return JSONResponse(content={"data": abstracts})
+    return ORJSONResponse(content={"data": abstracts})
 
 
 # abstract search
@@ -413,20 +478,19 @@ async def get_abstracts(
     try:
         user_info = get_user_info(authorization)
         user_id = user_info.get("user_id")
-        user_preference = get_data(user_id, preference_collection).get(
+        user_preference = (await preference_batcher.get(user_id)).get(
             edition, []
         )  # all preferences
     except:
         user_preference = []
 
-    es_search = Search(using=es, index=f"agenda-{edition}")
-    n_submissions = es_search.count()
+    n_submissions = await get_edition_count(edition)
     page_size = limit  # set page size to equal to limit
     current_page = int(skip / page_size) + 1
     n_page = int(n_submissions / page_size) + 1
 
     if current_page > n_page:
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "meta": {
                     "currentPage": current_page,
@@ -438,204 +502,154 @@ async def get_abstracts(
         )
 
     if view == "default":
-        submissions = utils.query_abstracts(
-            q, index=f"agenda-{edition}"
-        )  # get all responses
-        submissions = utils.filter_startend_time(
-            submissions, starttime, endtime
-        )  # filter by start, end time
-        if q == "" or q is None:
-            submissions = sorted(submissions, key=lambda x: x["starttime"])
-        return JSONResponse(
+        submissions, n_results = await utils.query_abstracts(
+            q,
+            index=f"agenda-{edition}",
+            starttime=starttime,
+            endtime=endtime,
+            skip=skip,
+            limit=limit,
+        )  # get a page of responses between start, end time
+        return ORJSONResponse(
             content={
                 "meta": {
                     "currentPage": current_page,
-                    "totalPage": int(len(submissions) / page_size) + 1,
+                    "totalPage": int(n_results / page_size) + 1,
                     "pageSize": page_size,
                 },
-                "links": {
-                    "current": query_params_builder()(
-                        f"/api/abstract/{edition}",
-                        [
-                            ("view", view),
-                            ("q", q),
-                            ("starttime", starttime),
-                            ("endtime", endtime),
-                            ("skip", skip),
-                            ("limit", page_size),
-                        ],
-                    ),
-                    "next": query_params_builder(current_page, n_page)(
-                        f"/api/abstract/{edition}",
-                        [
-                            ("view", view),
-                            ("q", q),
-                            ("starttime", starttime),
-                            ("endtime", endtime),
-                            ("skip", skip + page_size),
-                            ("limit", page_size),
-                        ],
-                    ),
-                },
-                "data": submissions[skip : skip + limit],
+                "links": page_links(
+                    f"/api/abstract/{edition}",
+                    [
+                        ("view", view),
+                        ("q", q),
+                        ("starttime", starttime),
+                        ("endtime", endtime),
+                    ],
+                    skip,
+                    page_size,
+                    current_page,
+                    n_page,
+                ),
+                "data": submissions,
             }
         )
     elif view == "your-votes":
         # Get preference from Firebase and return to frontend
         submission_ids = user_preference
-        submissions = [
-            utils.get_abstract(index=f"agenda-{edition}", id=idx)
-            for idx in submission_ids
-        ]
-        return JSONResponse(
+        submissions = await utils.get_abstracts(
+            index=f"agenda-{edition}", ids=submission_ids[skip : skip + limit]
+        )  # only fetch abstracts in the current page
+        return ORJSONResponse(
             content={
                 "meta": {
                     "currentPage": int(skip / page_size) + 1,
-                    "totalPage": int(len(submissions) / page_size) + 1,
+                    "totalPage": int(len(submission_ids) / page_size) + 1,
                     "pageSize": page_size,
                 },
-                "links": {
-                    "current": query_params_builder()(
-                        f"/api/abstract/{edition}",
-                        [
-                            ("view", view),
-                            ("skip", skip),
-                            ("limit", page_size),
-                        ],
-                    ),
-                    "next": query_params_builder(current_page, n_page)(
-                        f"/api/abstract/{edition}",
-                        [
-                            ("view", view),
-                            ("skip", skip + page_size),
-                            ("limit", page_size),
-                        ],
-                    ),
-                },
-                "data": submissions[skip : skip + limit]
-                if len(submissions) > 0
-                else [],
+                "links": page_links(
+                    f"/api/abstract/{edition}",
+                    [("view", view)],
+                    skip,
+                    page_size,
+                    current_page,
+                    n_page,
+                ),
+                "data": submissions,
             }
         )
     elif view == "recommendations":
         # TODOs: get votes for generating recommendations
         submission_ids = user_preference
+        # with a time window, rank all submissions before filtering so that
+        # no submission in the window is dropped, otherwise only rank top-k
+        time_window = starttime not in ["", None] or endtime not in ["", None]
+        n_recommend = None if time_window else max(skip + limit, N_RECOMMEND)
         try:
-            submissions = utils.generate_recommendations(
+            recommend_ids = await utils.generate_recommendations(
                 submission_ids,
                 data=embeddings,
                 index=f"agenda-{edition}",
                 nbrs_model=nbrs_models[f"agenda-{edition}"],
                 exploration=False,
-                abstract_info=True,
+                n_recommend=n_recommend,
+                abstract_info=False,
             )
+            recommend_ids = await utils.filter_ids_by_time(
+                recommend_ids, f"agenda-{edition}", starttime, endtime
+            )  # filter by start, end time
         except:
-            submissions = []
-        submissions = utils.filter_startend_time(submissions, starttime, endtime)
-        return JSONResponse(
+            recommend_ids = []
+        # top-k covers the current page, all submissions are ranked in total
+        n_recommend_total = len(recommend_ids)
+        if n_recommend is not None and n_recommend_total > 0:
+            n_recommend_total = len(embeddings[f"agenda-{edition}"]["ids"])
+        submissions = await utils.get_abstracts(
+            f"agenda-{edition}", recommend_ids[skip : skip + limit]
+        )  # only fetch abstracts in the current page
+        return ORJSONResponse(
             content={
                 "meta": {
                     "currentPage": int(skip / page_size) + 1,
-                    "totalPage": int(len(submissions) / page_size) + 1,
+                    "totalPage": int(n_recommend_total / page_size) + 1,
                     "pageSize": page_size,
                 },
-                "links": {
-                    "current": query_params_builder()(
-                        f"/api/abstract/{edition}",
-                        [
-                            ("view", view),
-                            ("starttime", starttime),
-                            ("endtime", endtime),
-                            ("skip", skip),
-                            ("limit", page_size),
-                        ],
-                    ),
-                    "next": query_params_builder(current_page, n_page)(
-                        f"/api/abstract/{edition}",
-                        [
-                            ("view", view),
-                            ("starttime", starttime),
-                            ("endtime", endtime),
-                            ("skip", skip + page_size),
-                            ("limit", page_size),
-                        ],
-                    ),
-                },
-                "data": submissions[skip : skip + limit]
-                if len(submissions) > 0
-                else [],
+                "links": page_links(
+                    f"/api/abstract/{edition}",
+                    [("view", view), ("starttime", starttime), ("endtime", endtime)],
+                    skip,
+                    page_size,
+                    current_page,
+                    n_page,
+                ),
+                "data": submissions,
             }
         )
     elif view == "personalized":
         # TODOs: get votes for generating personalized recommendation
         submission_ids = user_preference
-        submissions = utils.generate_personalized_recommendations(
+        submissions = await utils.generate_personalized_recommendations(
             submission_ids,
             data=embeddings,
             index=f"agenda-{edition}",
             nbrs_model=nbrs_models[f"agenda-{edition}"],
         )
         submissions = utils.filter_startend_time(submissions, starttime, endtime)
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "meta": {
                     "currentPage": int(skip / page_size) + 1,
                     "totalPage": int(len(submissions) / page_size) + 1,
                     "pageSize": page_size,
                 },
-                "links": {
-                    "current": query_params_builder()(
-                        f"/api/abstract/{edition}",
-                        [
-                            ("view", view),
-                            ("starttime", starttime),
-                            ("endtime", endtime),
-                            ("skip", skip),
-                            ("limit", page_size),
-                        ],
-                    ),
-                    "next": query_params_builder(current_page, n_page)(
-                        f"/api/abstract/{edition}",
-                        [
-                            ("view", view),
-                            ("starttime", starttime),
-                            ("endtime", endtime),
-                            ("skip", skip + page_size),
-                            ("limit", page_size),
-                        ],
-                    ),
-                },
+                "links": page_links(
+                    f"/api/abstract/{edition}",
+                    [("view", view), ("starttime", starttime), ("endtime", endtime)],
+                    skip,
+                    page_size,
+                    current_page,
+                    n_page,
+                ),
                 "data": submissions[skip : skip + limit]
                 if len(submissions) > 0
                 else [],
             }
         )
     else:
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "meta": {
                     "currentPage": current_page,
                     "totalPage": n_page,
                     "pageSize": page_size,
                 },
-                "links": {
-                    "current": query_params_builder()(
-                        f"/api/abstract/{edition}",
-                        [
-                            ("view", "default"),
-                            ("skip", skip),
-                            ("limit", page_size),
-                        ],
-                    ),
-                    "next": query_params_builder(current_page, n_page)(
-                        f"/api/abstract/{edition}",
-                        [
-                            ("view", "default"),
-                            ("skip", skip + page_size),
-                            ("limit", page_size),
-                        ],
-                    ),
-                },
+                "links": page_links(
+                    f"/api/abstract/{edition}",
+                    [("view", "default")],
+                    skip,
+                    page_size,
+                    current_page,
+                    n_page,
+                ),
                 "data": [],
             }
         )
@@ -649,15 +663,17 @@ async def get_abstract(edition: str, submission_id: str):
     Note: This will retrieve from ElasticSearch in case Airtable
         is not specified in es_config
     """
-    base_id = es_config["editions"][edition].get("airtable_id")
-    table_name = es_config["editions"][edition].get("table_name")
+    pair = EDITION_MAP.get(edition)
+    if pair is None:
+        return ORJSONResponse(status_code=status.HTTP_404_NOT_FOUND)
+    base_id, table_name = pair
     if base_id is None:
         # query from Elasticsearch
-        abstract = utils.get_abstract(index=f"agenda-{edition}", id=submission_id)
+        abstract = await utils.get_abstract(index=f"agenda-{edition}", id=submission_id)
     else:
         # query from Airtable
-        table = Table(api_key=airtable_key, base_id=base_id, table_name=table_name)
-        abstract = table.get(submission_id).get(
+        table = utils.get_table(airtable_key, base_id, table_name)
+        abstract = (await asyncio.to_thread(table.get, submission_id)).get(
             "fields", {}
         )  # return abstract from Airtable
     # add missing fields
@@ -665,7 +681,7 @@ async def get_abstract(edition: str, submission_id: str):
     abstract["submission_id"] = submission_id
     if abstract is None:
         abstract = {}
-    return JSONResponse(content={"data": abstract})
+    return ORJSONResponse(content={"data": abstract})
 
 
 @app.post("/api/abstract/{edition}")
@@ -679,30 +695,34 @@ async def create_abstract(
     user_info = get_user_info(authorization)
     user_id = get_user_info(authorization).get("user_id")
     if user_id is not None:
-        user = get_data(user_id, user_collection)
+        user = await user_batcher.get(user_id)
         submission["firstname"] = user.get("firstname", "")
         submission["lastname"] = user.get("lastname", "")
 
     # look for base_id for a given "edition"
-    base_id = es_config["editions"][edition].get("airtable_id")
-    table_name = es_config["editions"][edition].get("table_name")
+    pair = EDITION_MAP.get(edition)
+    if pair is None:
+        return ORJSONResponse(status_code=status.HTTP_404_NOT_FOUND)
+    base_id, table_name = pair
     if base_id is None:
         print("Seems like there is no Airtable set up, only a CSV file")
-        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST)
+        return ORJSONResponse(status_code=status.HTTP_400_BAD_REQUEST)
     else:
-        table = Table(api_key=airtable_key, base_id=base_id, table_name=table_name)
-        r = table.create(submission)  # create submission on Airtable
+        table = utils.get_table(airtable_key, base_id, table_name)
+        r = await asyncio.to_thread(
+            table.create, submission
+        )  # create submission on Airtable
         print(f"Set the record {r['id']} on Airtable")
 
         # update submission_id to user on Firebase
         if user_info is not None:
             user_id = user_info.get("user_id")
-            update_data(
+            await update_data(
                 {"submission_id": r["id"]}, user_id, user_collection
             )  # update submission id to a user on Firebase
-            return JSONResponse(status_code=status.HTTP_200_OK)
+            return ORJSONResponse(status_code=status.HTTP_200_OK)
         else:
-            return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
+            return ORJSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
 
 
 @app.put("/api/abstract/{edition}/{submission_id}")
@@ -722,7 +742,7 @@ async def update_abstract(
     print("Usedr Info: ", user_info)
     print("User ID: ", user_id)
     if user_id is not None:
-        user = get_data(user_id, user_collection)
+        user = await user_batcher.get(user_id)
         print(user)
         submission["firstname"] = user.get("firstname", "")
         submission["lastname"] = user.get("lastname", "")
@@ -746,16 +766,20 @@ async def update_abstract(
     }
 
     # look for base_id for a given "edition"
-    base_id = es_config["editions"][edition].get("airtable_id")
-    table_name = es_config["editions"][edition].get("table_name")
+    pair = EDITION_MAP.get(edition)
+    if pair is None:
+        return ORJSONResponse(status_code=status.HTTP_404_NOT_FOUND)
+    base_id, table_name = pair
     if base_id is None:
         print("Seems like there is no Airtable set up, only a CSV file")
-        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST)
+        return ORJSONResponse(status_code=status.HTTP_400_BAD_REQUEST)
     else:
-        table = Table(api_key=airtable_key, base_id=base_id, table_name=table_name)
-        r = table.update(submission_id, submission)  # update submission
+        table = utils.get_table(airtable_key, base_id, table_name)
+        r = await asyncio.to_thread(
+            table.update, submission_id, submission
+        )  # update submission
         print(f"Set the record {r['id']} on Airtable")
-        return JSONResponse(status_code=status.HTTP_200_OK)
+        return ORJSONResponse(status_code=status.HTTP_200_OK)
 
 
 @app.get("/api/school/schedule")
@@ -767,15 +791,18 @@ async def get_school_schedule(
     Returns school agenda from Airtable. Current function only
     return an edition 2021-1 since we made just for ACML 2021.
     """
+    pair = EDITION_MAP.get(edition)
+    if pair is None:
+        return ORJSONResponse(status_code=status.HTTP_404_NOT_FOUND)
+    base_id, _ = pair
     user_info = get_user_info(authorization)
     if user_info is not None:
-        table = Table(
-            airtable_key, es_config["editions"][edition]["airtable_id"], "school"
-        )
-        submissions = [r.get("fields") for r in table.all() if len(r.get("fields")) > 0]
+        table = utils.get_table(airtable_key, base_id, "school")
+        records = await asyncio.to_thread(table.all)
+        submissions = [r.get("fields") for r in records if len(r.get("fields")) > 0]
     else:
         submissions = []
-    return JSONResponse(content={"data": submissions})
+    return ORJSONResponse(content={"data": submissions})
 
 
 @app.post("/api/payment/{option}")
@@ -790,21 +817,21 @@ async def update_payment(
     collection = "payment"  # Firebase collection
     amount_options = [500, 1000, 1500, 2000, 2500, 3000]
     if payload is None:
-        return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
+        return ORJSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
     payload = payload.dict()
     amount = payload.get("amount", 1500)
     currency = payload.get("USD", "USD")
     if amount not in amount_options:
-        return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
+        return ORJSONResponse(status_code=status.HTTP_401_UNAUTHORIZED)
 
     user_info = get_user_info(authorization)
     user_id = user_info.get("user_id")
 
     if option == "check":
-        ref = get_data(user_id, collection)
+        ref = await get_data(user_id, collection)
         if ref is None:
             ref = {"payment_status": "wait", "amount": amount}
-        return JSONResponse(content=ref)
+        return ORJSONResponse(content=ref)
 
     elif option == "create":
         # create payment intent using Stripe API
@@ -822,29 +849,29 @@ async def update_payment(
                 "payment_intent_id": session["id"],
                 "amount": amount,
             }
-            set_data(
+            await set_data(
                 payment,
                 user_id,
                 "payment",
             )  # create payment
-            return JSONResponse(content={"client_secret": session["client_secret"]})
+            return ORJSONResponse(content={"client_secret": session["client_secret"]})
         except Exception as e:
             print(e)
-            return JSONResponse(content={})
+            return ORJSONResponse(content={})
 
     elif option == "set":
         # set the payment if payment is successful
-        payment_dict = get_data(user_id, "payment")
+        payment_dict = await get_data(user_id, "payment")
         payment_intent_id = payment_dict["payment_intent_id"]
         client_secret = payload["client_secret"]
 
         # mismatch intent ID
         if str(payment_intent_id) not in str(client_secret):
-            raise JSONResponse(status_code=status.HTTP_400_BAD_REQUEST)
+            return ORJSONResponse(status_code=status.HTTP_400_BAD_REQUEST)
 
         payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
         if payment_intent.status != "succeeded":
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "error": True,
                     "message": "Sorry, your payment was not successful. Please try again or contact us.",
@@ -852,7 +879,7 @@ async def update_payment(
             )
 
         # set payment to Firebase
-        set_data(
+        await set_data(
             {
                 "payment_status": "paid",
                 "payment_intent_id": payment_intent_id,
@@ -863,7 +890,7 @@ async def update_payment(
             user_id,
             collection,
         )
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "message": "Your payment was successful!",
             },
@@ -872,16 +899,16 @@ async def update_payment(
 
     elif option == "waive":
         # set payment as waived
-        set_data(
+        await set_data(
             {"payment_status": "waived", "amount": 0, "currency": "USD"},
             user_id,
             collection,
         )
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "message": "You payment has been waived.",
             },
             status_code=status.HTTP_200_OK,
         )
     else:
-        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND)
+        return ORJSONResponse(status_code=status.HTTP_404_NOT_FOUND)
@@ -4,6 +4,18 @@ We will mostly use pyairtable but we implement a few functions to use
 """
 import json
 import requests
+from functools import lru_cache
+from pyairtable import Table
+
+
+@lru_cache(maxsize=32)
+def get_table(airtable_key: str, base_id: str, table_name: str = "submissions"):
+    """
+    Get a pyairtable ``Table`` for a given ``base_id`` and ``table_name``.
+    Tables are cached so their HTTP session (and connection) is reused
+    across requests instead of creating a new one for every call.
+    """
+    return Table(airtable_key, base_id, table_name)
 
 
 def get_record(
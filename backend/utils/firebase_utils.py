@@ -1,6 +1,7 @@
 """
 Utilities for Firebase
 """
+import asyncio
 from typing import Optional
 from fastapi import status, Header
 from fastapi.responses import JSONResponse
@@ -11,7 +12,7 @@ from google.oauth2 import id_token
 from google.auth.transport.requests import Request
 
 
-db = firestore.Client()
+db = firestore.AsyncClient()
 HTTP_REQUEST = Request()
 
 
@@ -28,40 +29,45 @@ def get_user_info(authorization: Optional[str] = None):
         return None
 
 
-def get_all_collection(collection: str = "users"):
+async def get_all_collection(collection: str = "users"):
     """
     Get all collection from the user
     """
     rows = []
     ref = db.collection(collection)
-    for doc in ref.stream():
+    async for doc in ref.stream():
         row = doc.to_dict()
         row["id"] = doc.id
         rows.append(row)
     return rows
 
 
-def delete_data(doc_id: str, collection: str):
+async def delete_data(doc_id: str, collection: str):
     """
     Delete a record with ``doc_id`` from a given ``collection``
     """
-    db.collection(collection).document(doc_id).delete()
+    await db.collection(collection).document(doc_id).delete()
     print(f"Deleting {doc_id} from collection {collection}")
 
 
-def get_data(doc_id: str, collection: str):
+async def get_data(doc_id: str, collection: str):
     """Get data with ``doc_id`` from a given Firebase collection"""
     doc_ref = db.collection(collection).document(doc_id)
     try:
-        doc = doc_ref.get().to_dict()
+        doc = (await doc_ref.get()).to_dict()
     except google.cloud.exceptions.NotFound:
         doc = None
         print(f"No user with id = {doc_id}!")
     return doc
 
 
-def set_data(data: dict, doc_id: Optional[str] = None, collection: str = ""):
-    """Set data (as a dictionary) to a given Firebase collection"""
+async def set_data(
+    data: dict, doc_id: Optional[str] = None, collection: str = "", merge: bool = False
+):
+    """
+    Set data (as a dictionary) to a given Firebase collection,
+    if ``merge`` is True, merge data into an existing document
+    """
     if collection == "":
         return
     if doc_id is None:
@@ -70,11 +76,11 @@ def set_data(data: dict, doc_id: Optional[str] = None, collection: str = ""):
         else:
             doc_id = data.get("email")
     doc_ref = db.collection(collection).document(doc_id)
-    doc_ref.set(data)
+    await doc_ref.set(data, merge=merge)
     print(f"Set a record with {doc_id} to collection {collection}")
 
 
-def update_data(data: dict, doc_id: Optional[str] = None, collection: str = ""):
+async def update_data(data: dict, doc_id: Optional[str] = None, collection: str = ""):
     """Update data to a given Firebase collection"""
     if collection == "":
         return
@@ -84,5 +90,97 @@ def update_data(data: dict, doc_id: Optional[str] = None, collection: str = ""):
         else:
             doc_id = data.get("email")
     doc_ref = db.collection(collection).document(doc_id)
-    doc_ref.update(data)
+    await doc_ref.update(data)
     print(f"Set a record with {doc_id} to collection {collection}")
+
+
+class DocumentBatcher:
+    """
+    Batch concurrent reads from a given Firebase collection.
+    Document IDs requested within ``wait`` seconds are read together
+    with a single ``get_all`` call (up to ``max_batch_size`` documents).
+
+    >>> user_batcher = DocumentBatcher("users")
+    >>> user = await user_batcher.get(user_id)
+    """
+
+    def __init__(self, collection: str, max_batch_size: int = 500, wait: float = 0.01):
+        self.collection = collection
+        self.max_batch_size = max_batch_size
+        self.wait = wait
+        self.queue = None
+        self.task = None
+        self.read_tasks = set()  # keep references, event loop only holds weak ones
+
+    async def get(self, doc_id: str):
+        """Get data with ``doc_id``, returns None if there is no document"""
+        if doc_id is None:
+            return None
+        if self.task is None:
+            # start background task on the running event loop
+            self.queue = asyncio.Queue()
+            self.task = asyncio.create_task(self.run())
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((doc_id, future))
+        return await future
+
+    async def run(self):
+        """Collect requests from the queue and dispatch them in batches"""
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = [await self.queue.get()]
+                deadline = loop.time() + self.wait
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                # read in the background so the next batch can be collected meanwhile
+                task = asyncio.create_task(self.read_batch(batch))
+                self.read_tasks.add(task)
+                task.add_done_callback(self.read_tasks.discard)
+                batch = []
+        finally:
+            # cancelled while collecting, don't leave requests waiting
+            for _, future in batch:
+                future.cancel()
+
+    async def read_batch(self, batch: list):
+        """Read all documents in a batch and set the result of each request"""
+        try:
+            refs = {
+                doc_id: db.collection(self.collection).document(doc_id)
+                for doc_id, _ in batch
+            }
+            docs = {}
+            async for doc in db.get_all(list(refs.values())):
+                docs[doc.id] = doc.to_dict()
+            for doc_id, future in batch:
+                if not future.done():
+                    future.set_result(docs.get(doc_id))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # cancelled while reading, don't leave requests waiting
+            for _, future in batch:
+                future.cancel()
+
+    async def close(self):
+        """Stop the background tasks and cancel all pending requests"""
+        if self.task is None:
+            return
+        tasks = [self.task, *self.read_tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            future.cancel()
+        self.task = None
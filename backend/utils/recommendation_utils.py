@@ -4,20 +4,45 @@ Utilities for recommendation
 import numpy as np
 import pandas as pd
 from typing import Optional
-from sklearn.neighbors import NearestNeighbors
+import hnswlib
 
-from elasticsearch import Elasticsearch
+from utils.submission_utils import es
 
 np.random.seed(seed=126)  # apply seed for exploration sampling
 
-es = Elasticsearch(
-    [
-        {"host": "localhost", "port": 9200},
-    ]
-)
+
+def load_embeddings(path: str):
+    """
+    Load embeddings saved by ``scripts/embeddings.py``
+
+    path: str, path to NPZ file with submission ``ids`` and embedding matrix ``X``
+
+    Returns a dictionary with submission ``ids``, float32 embedding matrix ``X``
+    and ``positions``, mapping from submission ID to row of ``X``.
+    ``X`` is read-only since it is shared by all requests.
+    """
+    with np.load(path) as z:
+        ids = z["ids"].tolist()
+        # no copy if X is already a contiguous float32 array
+        X = np.ascontiguousarray(z["X"], dtype=np.float32)
+    X.setflags(write=False)
+    positions = {sid: i for i, sid in enumerate(ids)}
+    return {"ids": ids, "X": X, "positions": positions}
+
+
+def load_nbrs_model(path: str, dim: int):
+    """
+    Load approximate nearest neighbors (HNSW) index saved by ``scripts/embeddings.py``
+
+    path: str, path to HNSW index file
+    dim: int, dimension of the embeddings
+    """
+    nbrs_model = hnswlib.Index(space="cosine", dim=dim)
+    nbrs_model.load_index(path)
+    return nbrs_model
 
 
-def get_abstract(index: str = "agenda-2020-1", id: str = "1"):
+async def get_abstract(index: str = "agenda-2020-1", id: str = "1"):
     """
     Get abstract id from a given index.
 
@@ -26,7 +51,7 @@ def get_abstract(index: str = "agenda-2020-1", id: str = "1"):
     # return submission if we find submission ID from elasticsearch
     if id != "":
         try:
-            submission = es.get(index=index, id=id).get("_source", [])
+            submission = (await es.get(index=index, id=id)).get("_source", [])
             return submission
         except:
             return None
@@ -34,18 +59,19 @@ def get_abstract(index: str = "agenda-2020-1", id: str = "1"):
         return None
 
 
-def get_abstracts(index: str = "agenda-2020-1", ids: list = []):
+async def get_abstracts(index: str = "agenda-2020-1", ids: list = []):
     """
     Get multiple abstracts from a given list of submission ids.
 
     index: str, ElasticSearch index (see es_index.py) for the ElasticSearch name
     ids: list, list of abstract IDs
     """
-    # return submission if we find submission ID from elasticsearch
+    # fetch all submissions in one round-trip, docs are returned in the order
+    # of ``ids`` and submission IDs that are not in the index are skipped
     if len(ids) > 0:
         try:
-            out = es.mget(index=index, body={"ids": ids})
-            submissions = [r["_source"] for r in out["docs"]]
+            out = await es.mget(index=index, body={"ids": ids})
+            submissions = [r["_source"] for r in out["docs"] if r.get("found")]
             return submissions
         except:
             return []
@@ -53,11 +79,11 @@ def get_abstracts(index: str = "agenda-2020-1", ids: list = []):
         return []
 
 
-def generate_recommendations(
+async def generate_recommendations(
     submission_ids: list,
     data: dict,
     index: str,
-    nbrs_model: NearestNeighbors = None,
+    nbrs_model: hnswlib.Index = None,
     exploration: bool = False,
     n_recommend: Optional[int] = None,
     alpha: float = 1.2,
@@ -68,91 +94,88 @@ def generate_recommendations(
     (Each ID here is an Airtable ID)
 
     submission_ids: list, list of IDs that we want to produce recommendation
-    data: list,  dictionary of index to embedding data mapping
+    data: dict, dictionary of index to embeddings (see ``load_embeddings``)
     index: str, index of embedding data such as "agenda-2020-1", "agenda-2020-2", ...
-    nbrs_model: NearestNeighbors, nearest neighbors model
+    nbrs_model: hnswlib.Index, nearest neighbors index (see ``load_nbrs_model``)
     exploration: bool, if exploration is True, send
+    n_recommend: int, number of recommendations from the nearest neighbors index,
+        if None rank all submissions exactly with the embedding matrix
     alpha: float, factor multiplying to the preference vector (for Rochhio algorithm)
     abstract_info: bool, if False, returning only indices,
         if True returning full abstracts queried from ElasticSearch
 
     Example
     =======
-    >>> embedding_files = glob("../sitedata/embeddings/*.json")
-    >>> data = {op.basename(f).split('.')[0]: json.load(open(f, "r")) for f in embedding_files}
-    >>> generate_recommendations([1], data, "agenda-2020-1", nbrs_model, abstract_info=True)
+    >>> embedding_files = glob("../sitedata/embeddings/*.npz")
+    >>> data = {op.basename(f).split('.')[0]: load_embeddings(f) for f in embedding_files}
+    >>> await generate_recommendations([1], data, "agenda-2020-1", nbrs_model, abstract_info=True)
     """
     if len(submission_ids) == 0:
         return []
 
-    idx_mapping = {
-        r["submission_id"]: r["embedding"] for r in data[index]
-    }  # submission to embedding
-    idx_subid_mapping = {
-        i: r["submission_id"] for i, r in enumerate(data[index])
-    }  # idx to submission
+    ids, X, positions = data[index]["ids"], data[index]["X"], data[index]["positions"]
     # only use submissions id that exist in keys
-    submission_ids = [sid for sid in submission_ids if sid in idx_mapping.keys()]
-    pref_vector = (
-        alpha
-        * np.mean(
-            [
-                np.array(idx_mapping.get(sid))
-                for sid in submission_ids
-                if sid in idx_mapping.keys()
-            ],
-            axis=0,
-        )
-        .reshape(-1, 1)
-        .T
+    submission_ids = [sid for sid in submission_ids if sid in positions]
+    if len(submission_ids) == 0:
+        return []
+    pref_vector = alpha * X[[positions[sid] for sid in submission_ids]].mean(
+        axis=0, keepdims=True
     )
-    distances, indices = nbrs_model.kneighbors(pref_vector)
-    indices = indices.ravel()
-    distances = distances.ravel()
+    if n_recommend is None:
+        # rank all submissions, exact cosine distances with the embedding matrix
+        # are cheaper than walking the full nearest neighbors graph
+        q = pref_vector.ravel()
+        norms = np.linalg.norm(X, axis=1) * np.linalg.norm(q)
+        distances = 1 - (X @ q) / np.maximum(norms, 1e-12)
+        indices = np.argsort(distances, kind="stable")
+        distances = distances[indices]
+    else:
+        # approximate top-k neighbors, keep ef small for fast queries
+        k = min(n_recommend + 1, nbrs_model.get_current_count())
+        nbrs_model.set_ef(max(k, 50))  # ef has to be at least k
+        indices, distances = nbrs_model.knn_query(pref_vector, k=k)
+        indices = indices.ravel()
+        distances = distances.ravel()
     # if exploration is True, we will sample with probabilities
     # calculated by the inverse distances
     if exploration:
         w = 1 / (distances + 1e-3)
         probs = w / np.sum(w)
         indices = np.random.choice(indices, size=len(indices), replace=False, p=probs)
-    recommend_indices = [
-        idx_subid_mapping.get(idx) for idx in indices if idx in idx_subid_mapping.keys()
-    ]  # recommendation indices
-    if n_recommend:
-        recommend_indices = recommend_indices[0 : n_recommend + 1]
+    recommend_indices = [ids[idx] for idx in indices]  # recommendation indices
 
     if abstract_info:
-        recommend_abstracts = get_abstracts(index, recommend_indices)
+        recommend_abstracts = await get_abstracts(index, recommend_indices)
         return recommend_abstracts
     else:
         return recommend_indices
 
 
-def generate_personalized_recommendations(
+async def generate_personalized_recommendations(
     submission_ids: list,
-    data: list,
+    data: dict,
     index: str,
-    nbrs_model: NearestNeighbors = None,
+    nbrs_model: hnswlib.Index = None,
 ):
     """
     Generate personalized recommendations
     for a given submission ids, given data, index, and nearest neighbors model
 
     submission_ids: list, list of IDs that we want to produce recommendation
-    data: dict, dictionary of index to embedding data mapping
+    data: dict, dictionary of index to embeddings (see ``load_embeddings``)
     index: str, index of embedding data such as "agenda-2020-1", "agenda-2020-2", ...
-    nbrs_model: NearestNeighbors, nearest neighbors model
+    nbrs_model: hnswlib.Index, nearest neighbors index (see ``load_nbrs_model``)
 
     Example
     =======
-    >>> embedding_files = glob("../sitedata/embeddings/*.json")
-    >>> data = {op.basename(f).split('.')[0]: json.load(open(f, "r")) for f in embedding_files}
-    >>> generate_personalized_recommendations([1], data, "agenda-2020-1", nbrs_model, abstract_info=True)
+    >>> embedding_files = glob("../sitedata/embeddings/*.npz")
+    >>> data = {op.basename(f).split('.')[0]: load_embeddings(f) for f in embedding_files}
+    >>> await generate_personalized_recommendations([1], data, "agenda-2020-1", nbrs_model, abstract_info=True)
     """
     if len(submission_ids) == 0:
         return []
 
-    rec_submissions = generate_recommendations(
+    rec_submissions = await generate_recommendations(
         submission_ids, data, index, nbrs_model, n_recommend=None, abstract_info=True
     )
     if len(rec_submissions) == 0:
@@ -162,7 +185,7 @@ def generate_personalized_recommendations(
 
     # for other events, just recommend the closest event within a given starttime
     selected_ids = list(set(submission_ids))
-    selected_df = pd.DataFrame(get_abstracts(index, selected_ids))
+    selected_df = pd.DataFrame(await get_abstracts(index, selected_ids))
     selected_df["starttime_sort"] = pd.to_datetime(selected_df.starttime)
     personalized_rec_df = (
         pd.concat((selected_df, rec_submissions_df), axis=0)
@@ -5,12 +5,13 @@ import pandas as pd
 from typing import Optional
 
 from pytz import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
 
-from elasticsearch import Elasticsearch
-from elasticsearch_dsl import Search
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_scan
+from elasticsearch_dsl import Search, Q
 
-es = Elasticsearch(
+es = AsyncElasticsearch(
     [
         {"host": "localhost", "port": 9200},
     ]
@@ -18,15 +19,42 @@ es = Elasticsearch(
 utc = timezone("UTC")
 
 
+def parse_datetime(dt: str):
+    """
+    Parse datetime in string, use ``datetime.fromisoformat`` for ISO 8601
+    strings and only fall back to ``pd.to_datetime`` for other formats
+    """
+    try:
+        return datetime.fromisoformat(dt.replace("Z", "+00:00"))
+    except (ValueError, TypeError, AttributeError):
+        return pd.to_datetime(dt)
+
+
 def convert_utc(dt: str):
     """Convert datetime in string to UTC"""
     utc = timezone("UTC")
-    dt = pd.to_datetime(dt)
+    dt = parse_datetime(dt)
     if dt.tzinfo is None:
         dt = utc.localize(dt)
     return dt
 
 
+def time_range_filters(starttime: Optional[str] = None, endtime: Optional[str] = None):
+    """
+    Create ElasticSearch range filters that keep events starting after
+    ``starttime`` and ending before ``endtime`` (assuming UTC if no timezone).
+    Returns an empty list if neither is given.
+    """
+    filters = []
+    if starttime not in ["", None]:
+        filters.append(
+            Q("range", starttime={"gte": convert_utc(starttime).isoformat()})
+        )
+    if endtime not in ["", None]:
+        filters.append(Q("range", endtime={"lte": convert_utc(endtime).isoformat()}))
+    return filters
+
+
 def convert_es_responses_to_list(search_responses: list):
     """
     Convert responses from ElasticSearch to list.
@@ -41,7 +69,7 @@ def convert_es_responses_to_list(search_responses: list):
     return submissions
 
 
-def query(
+async def query(
     q: Optional[str] = None,
     n_results: Optional[int] = None,
     index: str = "grid",
@@ -55,21 +83,22 @@ def query(
     index: str, index of ElasticSearch, default grid
     fields: search fields
     """
-    es_search = Search(using=es, index=index)
     if q is None or q.strip() == "":
-        search_responses = [hit.to_dict() for hit in es_search.scan()]
+        search_responses = [hit["_source"] async for hit in async_scan(es, index=index)]
     else:
         if n_results is None:
-            n_results = es_search.count()
-        responses = es_search.query("multi_match", query=q, fields=fields)
-        search_responses = responses[0:n_results].execute()
-        search_responses = search_responses.to_dict()["hits"]["hits"]
+            n_results = (await es.count(index=index))["count"]
+        es_search = Search().query("multi_match", query=q, fields=fields)
+        search_responses = await es.search(
+            index=index, body=es_search[0:n_results].to_dict()
+        )
+        search_responses = search_responses["hits"]["hits"]
         if index != "grid":
             search_responses = convert_es_responses_to_list(search_responses)
     return search_responses
 
 
-def query_affiliations(
+async def query_affiliations(
     q: str = "University of Pennsylvania",
     n_results: int = 10,
     index: str = "grid",
@@ -79,30 +108,77 @@ def query_affiliations(
     Query affiliation from a GRID index,
     assuming that GRID data is indexed via the scripts.
     """
-    responses = query(q, n_results, index, fields)
+    responses = await query(q, n_results, index, fields)
     query_suggestions = [f"{response['_source']['Name']}" for response in responses]
     return list(pd.unique(query_suggestions))
 
 
-def query_abstracts(
+async def query_abstracts(
     q: Optional[str] = None,
-    n_results: Optional[int] = None,
     index: str = "agenda-2020-1",
     fields: list = ["title^2", "abstract", "fullname", "institution"],
+    starttime: Optional[str] = None,
+    endtime: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = None,
 ):
     """
-    Query abstracts from a given Elastic index
+    Query a page of abstracts from a given Elastic index.
+    Without query string, abstracts are sorted by starttime.
+    Returns the abstracts and the total number of matched abstracts.
 
     q: str, query
-    n_results: int, number of results from
     index: str, index of ElasticSearch
     fields: list, list of fields that are included in the search
+    starttime: str, only return events starting after starttime
+    endtime: str, only return events ending before endtime
+    skip: int, number of abstracts to skip
+    limit: int, number of abstracts to return, if None return all abstracts
     """
-    responses = query(q, n_results, index, fields)
-    return responses
-
+    es_search = Search().extra(track_total_hits=True)
+    for f in time_range_filters(starttime, endtime):
+        es_search = es_search.filter(f)
+    if q is None or q.strip() == "":
+        es_search = es_search.sort("starttime")
+    else:
+        es_search = es_search.query("multi_match", query=q, fields=fields)
+    if limit is None:
+        limit = (await es.count(index=index))["count"]
+    es_search = es_search[skip : skip + limit]  # translated to from, size
+    responses = await es.search(index=index, body=es_search.to_dict())
+    n_results = responses["hits"]["total"]["value"]
+    submissions = convert_es_responses_to_list(responses["hits"]["hits"])
+    return submissions, n_results
+
+
+async def filter_ids_by_time(
+    ids: list,
+    index: str = "agenda-2020-1",
+    starttime: Optional[str] = None,
+    endtime: Optional[str] = None,
+):
+    """
+    Keep submission IDs with events between starttime and endtime.
+    Filtering is done by ElasticSearch and the order of ``ids`` is kept.
 
-def get_agenda(
+    ids: list, list of submission IDs
+    index: str, index of ElasticSearch
+    starttime: str, only keep events starting after starttime
+    endtime: str, only keep events ending before endtime
+    """
+    filters = time_range_filters(starttime, endtime)
+    if len(filters) == 0 or len(ids) == 0:
+        return ids
+    es_search = Search().filter("ids", values=ids)
+    for f in filters:
+        es_search = es_search.filter(f)
+    es_search = es_search.source(False)[0 : len(ids)]
+    responses = await es.search(index=index, body=es_search.to_dict())
+    found_ids = {hit["_id"] for hit in responses["hits"]["hits"]}
+    return [sid for sid in ids if sid in found_ids]
+
+
+async def get_agenda(
     index: str = "agenda-2020-1", starttime: Optional[str] = None, sort: bool = True
 ):
     """
@@ -117,14 +193,12 @@ def get_agenda(
         assuming that starttime is in UTC
     """
     agenda = []
-    for hit in Search(using=es, index=index).scan():
+    async for hit in async_scan(es, index=index):
+        hit = hit["_source"]
         # check if starttime and endtime both available
-        if (
-            hit.to_dict().get("starttime") is not None
-            and hit.to_dict().get("endtime") is not None
-        ):
-            dt_start = pd.to_datetime(hit["starttime"])
-            dt_end = pd.to_datetime(hit["endtime"])
+        if hit.get("starttime") is not None and hit.get("endtime") is not None:
+            dt_start = parse_datetime(hit["starttime"])
+            dt_end = parse_datetime(hit["endtime"])
 
             if (starttime is not None) or (starttime == ""):
                 startday = convert_utc(starttime)
@@ -132,12 +206,12 @@ def get_agenda(
                 if dt_start >= startday and dt_end <= endday:
                     hit["starttime"] = dt_start.isoformat()
                     hit["endtime"] = dt_end.isoformat()
-                    agenda.append(hit.to_dict())
+                    agenda.append(hit)
             else:
-                agenda.append(hit.to_dict())
+                agenda.append(hit)
     # sort agenda if sort is True
     if sort:
-        agenda = sorted(agenda, key=lambda x: pd.to_datetime(x["starttime"]))
+        agenda = sorted(agenda, key=lambda x: parse_datetime(x["starttime"]))
     return agenda
 
 
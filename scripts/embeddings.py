@@ -3,7 +3,7 @@ Transform text to embeddings using
 Original code from https://github.com/Mini-Conf/Mini-Conf/blob/master/scripts/embeddings.py
 
 Usage:
-    embeddings.py [--option=<option>] [--n_components=<n_components>] [--n_recommend=<n_recommend>]
+    embeddings.py [--option=<option>] [--n_components=<n_components>]
     embeddings.py [-h | --help]
     embeddings.py [-v | --version]
 
@@ -12,26 +12,24 @@ Options:
     --version       Show version
     --option=<option>               Embedding calculation, can be ``lsa`` or ``sent_embed``, default ``lsa``
     --n_components=<n_components>   Number of components for LSA
-    --n_recommend=<n_recommend>     Number of recommendation, if not defined, recommend all submissions
 """
 import os
 import os.path as op
-import json
 import yaml
 from glob import glob
 from docopt import docopt
 from dotenv import load_dotenv
 
-import joblib
+import hnswlib
 import numpy as np
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
 import pandas as pd
 from pyairtable import Table
 from tqdm.auto import tqdm
-from transformers import AutoTokenizer, AutoModel
 
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
 from sklearn.decomposition import TruncatedSVD
-from sklearn.neighbors import NearestNeighbors
 
 from es_index import read_submissions, keys_airtable
 
@@ -52,18 +50,20 @@ def chunks(lst, chunk_size=MAX_BATCH_SIZE):
         yield lst[i : i + chunk_size]
 
 
-def preprocess(text):
+def embedding_option(df, option="lsa", n_components=30):
     """
-    Function to preprocess text
-
-    TODOs: use stemming for preprocessing
+    Returns the embedding option used by ``calculate_embeddings`` for ``df``,
+    LSA falls back to ``sent_embed`` if there are less submissions than components
     """
-    return text.lower()
+    if option == "lsa" and len(df) < n_components:
+        return "sent_embed"
+    return option
 
 
 def calculate_embeddings(df, option="lsa", n_papers=MAX_BATCH_SIZE, n_components=30):
     """Calculates embeddings from a given dataframe
-    assume dataframe has title and abstract in the columns
+    assume dataframe has title and abstract in the columns.
+    Returns a float32 matrix where row i is the embedding of ``df`` row i.
 
     option: str, if ``lsa`` use Latent Semantic Analysis
         if ``sent_embed`` use Specter from AllenAI
@@ -72,13 +72,17 @@ def calculate_embeddings(df, option="lsa", n_papers=MAX_BATCH_SIZE, n_components
         Larger one takes too long on regular laptop
     """
     assert option in ["lsa", "sent_embed"]
-    if len(df) < n_components:
+    if embedding_option(df, option, n_components) != option:
         print(
             "Length of dataframe is less than number of projected components, \
             set option to sent_embed instead"
         )
         option = "sent_embed"
     if option == "sent_embed":
+        # import here since transformers (and torch) are slow to import
+        # and only needed for sent_embed
+        from transformers import AutoTokenizer, AutoModel
+
         print("Download SPECTER model for creating embedding\n")
         tokenizer = AutoTokenizer.from_pretrained("allenai/specter")
         model = AutoModel.from_pretrained("allenai/specter")
@@ -91,35 +95,97 @@ def calculate_embeddings(df, option="lsa", n_papers=MAX_BATCH_SIZE, n_components
             )
             result = model(**inputs)
             embeddings.extend(result.last_hidden_state[:, 0, :])
-        embeddings = [emb.tolist() for emb in embeddings]
-        paper_embeddings = [
-            {"submission_id": str(pid), "embedding": embedding}
-            for pid, embedding in zip(df.submission_id, embeddings)
-        ]
+        X = np.vstack([emb.detach().numpy() for emb in embeddings])
     elif option == "lsa":
-        tfidf_model = TfidfVectorizer(
-            min_df=3,
-            max_df=0.85,
+        # hashing trick avoids building the n-gram vocabulary
+        hashing_model = HashingVectorizer(
+            n_features=2**18,
             lowercase=True,
-            norm="l2",
             ngram_range=(1, 2),
-            use_idf=True,
-            smooth_idf=True,
-            sublinear_tf=True,
             stop_words="english",
+            alternate_sign=False,
+            norm=None,
+        )
+        tfidf_model = TfidfTransformer(
+            norm="l2", use_idf=True, smooth_idf=True, sublinear_tf=True
+        )
+        topic_model = TruncatedSVD(
+            n_components=n_components, algorithm="randomized", n_iter=5
         )
-        topic_model = TruncatedSVD(n_components=n_components, algorithm="arpack")
-        papers = (df["title"] + " " + df["abstract"]).map(preprocess)
-        X_tfidf = tfidf_model.fit_transform(papers)
-        X_topic = topic_model.fit_transform(X_tfidf)
-        paper_embeddings = [
-            {"submission_id": str(pid), "embedding": list(embedding)}
-            for pid, embedding in zip(df.submission_id, X_topic)
-        ]
+        papers = (df["title"].fillna("") + " " + df["abstract"].fillna("")).str.lower()
+        X_counts = hashing_model.transform(papers).tocsc()
+        # keep hashed terms with 3 <= document frequency <= 0.85 * n_docs,
+        # same as min_df=3, max_df=0.85 of a vocabulary based vectorizer
+        df_counts = np.asarray((X_counts > 0).sum(axis=0)).ravel()
+        keep = np.flatnonzero((df_counts >= 3) & (df_counts <= 0.85 * len(papers)))
+        X_tfidf = tfidf_model.fit_transform(X_counts[:, keep])
+        X = topic_model.fit_transform(X_tfidf)
     else:
         print("Please specify option as ``lsa`` or ``sent_embed``")
-        paper_embeddings = None
-    return paper_embeddings
+        return None
+    return X.astype(np.float32)
+
+
+def read_edition(v):
+    """
+    Read submissions of one conference edition to a dataframe
+
+    v: dict, configuration of the edition from ``es_config.yml``
+    """
+    path = v.get("path", "")
+    if path.lower().endswith(".json"):
+        df = pd.read_json(path).fillna("")
+    elif path.lower().endswith(".csv"):
+        df = pd.read_csv(path).fillna("")
+    elif v.get("airtable_id") is not None:
+        # if filter_accepted, only filter accepted submissions
+        filter_accepted = v.get("filter_accepted", False)
+        submissions = Table(airtable_key, v["airtable_id"], v["table_name"]).all()
+        submissions = read_submissions(
+            submissions, keys=keys_airtable, filter_accepted=filter_accepted
+        )
+        df = pd.DataFrame(submissions).fillna("")
+    else:
+        df = pd.read_csv(path).fillna("")
+    return df
+
+
+def process_edition(k, df, save_path, option="lsa", n_components=30):
+    """
+    Calculate embeddings and nearest neighbors index for one conference edition
+    and save them to ``save_path``
+
+    k: str, conference edition such as 2020-1
+    df: pd.DataFrame, submissions of the edition, see ``read_edition``
+    save_path: str, folder to save embeddings and nearest neighbors index
+    option: str, ``lsa`` or ``sent_embed``, see ``calculate_embeddings``
+    n_components: int, number of components for LSA
+    """
+    # LSA editions run in parallel processes, limit BLAS threads to one per process
+    with threadpool_limits(limits=1 if option == "lsa" else None):
+        print(f"Calculate embeddings for edition {k}\n")
+        basename = f"agenda-{k}"
+
+        # calculate embeddings, save submission IDs and embedding matrix
+        # in NPZ with the same basename
+        X = calculate_embeddings(df, option=option, n_components=n_components)
+        # store IDs as fixed-width unicode, object arrays would be pickled
+        # and the backend loads NPZ files with ``allow_pickle=False``
+        ids = df.submission_id.astype(str).to_numpy(dtype=str)
+        embeddings_path = op.join(save_path, basename + ".npz")
+        np.savez(embeddings_path, ids=ids, X=X)
+        # check that the saved file round-trips the way the backend loads it
+        with np.load(embeddings_path) as z:
+            if z["ids"].tolist() != ids.tolist() or z["X"].shape != X.shape:
+                raise ValueError(f"Saved embeddings {embeddings_path} are corrupted")
+
+        # approximate nearest neighbors (HNSW) index, labels are rows of X,
+        # save in HNSW with the same basename
+        nbrs_model = hnswlib.Index(space="cosine", dim=X.shape[1])
+        nbrs_model.init_index(max_elements=len(X), ef_construction=200, M=16)
+        nbrs_model.add_items(X, np.arange(len(X)))
+        nbrs_model.save_index(op.join(save_path, basename + ".hnsw"))
+        print(f"Saved embeddings and nearest neighbor model for edition {k}")
 
 
 if __name__ == "__main__":
@@ -143,47 +209,12 @@ if __name__ == "__main__":
         n_components = 30
     n_components = int(n_components)
 
-    for k, v in tqdm(es_config["editions"].items()):
-        print(f"Calculate embeddings for edition {k}\n")
-        basename = f"agenda-{k}"
-        path = v.get("path", "")
-        if path.lower().endswith(".json"):
-            df = pd.read_json(path).fillna("")
-        elif path.lower().endswith(".csv"):
-            df = pd.read_csv(path).fillna("")
-        elif v.get("airtable_id") is not None:
-            # if filter_accepted, only filter accepted submissions
-            filter_accepted = v.get("filter_accepted", False)
-            submissions = Table(airtable_key, v["airtable_id"], v["table_name"]).all()
-            submissions = read_submissions(
-                submissions, keys=keys_airtable, filter_accepted=filter_accepted
-            )
-            df = pd.DataFrame(submissions).fillna("")
-        else:
-            df = pd.read_csv(path).fillna("")
-
-        # number of recommendation
-        n_recommend = arguments.get("--n_recommend")
-        if n_recommend is None:
-            n_recommend = len(df)
-        n_recommend = min(int(n_recommend), len(df))
-
-        # calculate embeddings, save in JSON with the same basename
+    # read submissions and decide the embedding option used for each edition
+    editions = {"lsa": [], "sent_embed": []}
+    for k, v in es_config["editions"].items():
+        df = read_edition(v)
         if len(df) > 0 and v.get("index", True):
-            paper_embeddings = calculate_embeddings(
-                df, option=option, n_components=n_components
-            )
-            json.dump(
-                paper_embeddings,
-                open(op.join(save_path, basename + ".json"), "w"),
-                indent=2,
-            )
-
-            # nearest neighbors, save in joblib with the same basename
-            X = np.vstack([p["embedding"] for p in paper_embeddings])
-            nbrs_model = NearestNeighbors(n_neighbors=n_recommend).fit(X)
-            joblib.dump(nbrs_model, op.join(save_path, basename + ".joblib"))
-            print(f"Saved embeddings and nearest neighbor model for edition {k}")
+            editions[embedding_option(df, option, n_components)].append((k, df))
         else:
             if not v.get("index"):
                 print(
@@ -191,3 +222,11 @@ if __name__ == "__main__":
                 )
             else:
                 print("Length of dataframe is 0, please recheck the data.")
+
+    # only parallelize LSA, SPECTER model is too large to load once per edition
+    # and torch already uses multiple threads
+    for edition_option, n_jobs in [("lsa", -1), ("sent_embed", 1)]:
+        Parallel(n_jobs=n_jobs, backend="loky", verbose=10)(
+            delayed(process_edition)(k, df, save_path, edition_option, n_components)
+            for k, df in editions[edition_option]
+        )